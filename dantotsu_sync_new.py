@@ -1,15 +1,23 @@
 import requests
+import asyncio
+import httpx
 import json
+import orjson
 import csv
 import webbrowser
+import threading
 import time
 import os
 import re
 import random
+import pickle
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from datetime import datetime, timedelta, timezone
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # --- CONFIGURATION ---
 APP_AUTH_KEY = os.getenv("APP_AUTH_KEY", "")
@@ -25,6 +33,30 @@ ANILIST_CLIENT_ID = "33909"
 ANILIST_CLIENT_SECRET = "FmA0Bi0ahaxY0x2IW0CVtXTer5wREKBp8fDA0ZIz"
 
 DB_PATH = Path("dantotsu_global_db.csv")
+# comment_id -> byte offset of each row's deleted flag, validated by mtime;
+# lets Smart Sync flip deletions in place instead of rewriting the file
+IDX_PATH = Path("dantotsu_global_db.idx")
+
+def _retry_after_seconds(headers, fallback):
+    """Seconds to wait from a Retry-After header.
+
+    Tolerates the HTTP-date form (valid per RFC 7231) and junk values by
+    returning the caller's fallback instead of raising."""
+    try:
+        return int(headers.get('Retry-After', ''))
+    except (TypeError, ValueError):
+        return fallback
+
+# Byte shapes of an empty comment page — matched before bothering to parse,
+# since the end-of-thread probe is issued once for every media
+_EMPTY_COMMENTS = (b'{"comments":[]}', b'{"comments": []}')
+
+# Hot-loop patterns compiled once at import
+_MEDIA_RE = re.compile(r'\* Media: (\d+)')
+_DELCID_RE = re.compile(r'comment_id[:\s]+(\d+)')
+# Delete-command mention and the comment_id it names, in one scan — replaces
+# a substring search over the whole message plus a second regex pass
+_DELCMD_CID_RE = re.compile(re.escape(DELETE_CMD_ID) + r'.*?comment_id[:\s]+(\d+)', re.DOTALL)
 
 class AniListAuthenticator:
     def __init__(self, client_id, client_secret):
@@ -65,6 +97,15 @@ class DantotsuManager:
     def __init__(self, al_authenticator):
         self.auth = al_authenticator
         self.d_token = None
+        self._local = threading.local()       # one Session per worker thread
+        self._write_lock = threading.Lock()   # CSV writer is not thread-safe
+        self._backoff = threading.Event()     # set while any worker is rate-limited
+        self.user_cache = {}                  # user_id -> full user record
+        # Separate session for Discord: the Dantotsu sessions carry the
+        # appauth secret in their default headers and it must never be sent
+        # to a third-party host
+        self.discord_session = requests.Session()
+        self.discord_session.headers.update({"Authorization": DISCORD_TOKEN})
         self.field_names = [
             'comment_id', 'user_id', 'media_id', 'parent_comment_id', 'content', 
             'timestamp', 'deleted', 'tag', 'upvotes', 'downvotes', 
@@ -85,103 +126,247 @@ class DantotsuManager:
             print(f"Connection Error: {e}")
         return False
 
+    def _thread_session(self):
+        """Per-thread requests.Session so each worker reuses its own pooled
+        keep-alive connection instead of a fresh TCP+TLS handshake per call."""
+        s = getattr(self._local, 'session', None)
+        if s is None:
+            s = requests.Session()
+            s.headers.update({"appauth": APP_AUTH_KEY, "Authorization": self.d_token})
+            # Transient connection failures and 502/503 retry inside urllib3;
+            # 429 stays app-level so the shared backoff Event keeps working
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32,
+                                  max_retries=Retry(total=3, backoff_factor=1,
+                                                    status_forcelist=[502, 503],
+                                                    respect_retry_after_header=True))
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            self._local.session = s
+        return s
+
     def fetch_user_data(self, user_id):
         """Fetch detailed user data if available"""
-        headers = {"appauth": APP_AUTH_KEY, "Authorization": self.d_token}
-        try:
-            r = requests.get(f"{API_ADDRESS}/users/{user_id}", headers=headers, timeout=10)
-            if r.status_code == 200:
-                return r.json()
-            elif r.status_code == 429:
-                time.sleep(30)
-                return self.fetch_user_data(user_id)
-        except:
-            pass
+        session = self._thread_session()
+        for attempt in range(8):
+            try:
+                r = session.get(f"{API_ADDRESS}/users/{user_id}", timeout=10)
+                if r.status_code == 200:
+                    return orjson.loads(r.content)
+                if r.status_code != 429:
+                    return None
+                delay = _retry_after_seconds(r.headers, 2 ** attempt)
+            except:
+                return None
+            time.sleep(min(delay, 60))
         return None
 
+    _IMPORTANT_USER_FIELDS = ('username', 'profile_picture_url', 'is_mod', 'is_admin')
+
+    def _enrich_users(self, comments):
+        """Pre-fetch missing user records for a batch of comments.
+
+        One concurrent pass per batch fills self.user_cache so format_row
+        never stalls the writer on a per-comment HTTP round-trip; users seen
+        once are never fetched again for the rest of the run."""
+        missing = set()
+        for c in comments:
+            u = c.get('user') or {}
+            uid = u.get('id')
+            if uid and uid not in self.user_cache and \
+                    any(not u.get(f) for f in self._IMPORTANT_USER_FIELDS):
+                missing.add(uid)
+        if not missing:
+            return
+        if len(missing) == 1:
+            uid = next(iter(missing))
+            data = self.fetch_user_data(uid)
+            if data: self.user_cache[uid] = data
+            return
+        with ThreadPoolExecutor(max_workers=16) as ex:
+            for uid, data in zip(missing, ex.map(self.fetch_user_data, missing)):
+                if data: self.user_cache[uid] = data
+
     def format_row(self, c):
+        """Build one CSV row as a tuple in field_names order.
+
+        A positional tuple instead of a 17-key dict: the bulk writers go
+        through csv.writer with no per-row dict allocation or key hashing."""
         u = c.get('user') if c.get('user') is not None else {}
-        
-        # Check if any important user data is missing
-        important_fields = ['username', 'profile_picture_url', 'is_mod', 'is_admin']
-        missing_data = any(not u.get(field) for field in important_fields)
-        
-        # Try to get user details if any important data is missing
-        if missing_data and u.get('id'):
-            user_data = self.fetch_user_data(u['id'])
-            if user_data:
-                u = user_data  # Override with full user data
-        
-        return {
-            'comment_id': c.get('comment_id'),
-            'user_id': c.get('user_id'),
-            'media_id': c.get('media_id'),
-            'parent_comment_id': c.get('parent_comment_id', 'NULL'),
-            'content': str(c.get('content', '')).replace('\t', ' ').replace('\n', ' '),
-            'timestamp': c.get('timestamp'),
-            'deleted': 1 if c.get('deleted') is True else 0,
-            'tag': c.get('tag', 'NULL'),
-            'upvotes': int(c.get('upvotes', 0)),
-            'downvotes': int(c.get('downvotes', 0)),
-            'user_vote_type': c.get('user_vote_type', 0),
-            'username': u.get('username', 'NULL'),
-            'profile_picture_url': u.get('profile_picture_url', 'NULL'),
-            'is_mod': 1 if u.get('is_mod') is True else 0,
-            'is_admin': 1 if u.get('is_admin') is True else 0,
-            'reply_count': int(c.get('reply_count', 0)),
-            'total_votes': int(c.get('total_votes', 0))
-        }
+
+        # Fill gaps from the enrichment cache — no HTTP on this path
+        if any(not u.get(field) for field in self._IMPORTANT_USER_FIELDS):
+            u = self.user_cache.get(u.get('id'), u)
+
+        # Treat a key that is present-but-None the same as a missing key, so
+        # this path and _rows_dataframe (where both become NaN) agree on the
+        # serialized row regardless of which one a batch goes through.
+        parent_id = c.get('parent_comment_id')
+        tag = c.get('tag')
+        username = u.get('username')
+        pfp = u.get('profile_picture_url')
+        return (
+            c.get('comment_id'),
+            c.get('user_id'),
+            c.get('media_id'),
+            'NULL' if parent_id is None else parent_id,
+            str(c.get('content') or '').replace('\t', ' ').replace('\n', ' '),
+            c.get('timestamp'),
+            1 if c.get('deleted') is True else 0,
+            'NULL' if tag is None else tag,
+            int(c.get('upvotes') or 0),
+            int(c.get('downvotes') or 0),
+            int(c.get('user_vote_type') or 0),
+            'NULL' if username is None else username,
+            'NULL' if pfp is None else pfp,
+            1 if u.get('is_mod') is True else 0,
+            1 if u.get('is_admin') is True else 0,
+            int(c.get('reply_count') or 0),
+            int(c.get('total_votes') or 0)
+        )
+
+    # Below this many comments the DataFrame setup costs more than it saves
+    _VECTORIZE_MIN = 500
+
+    def _rows_dataframe(self, comments):
+        """Vectorized equivalent of format_row for large batches.
+
+        The per-field coercions (fillna, astype, eq) run as column-wise C
+        loops instead of 17 Python-level ops per comment. Output columns
+        match field_names order so to_csv appends straight onto the DB."""
+        users = [self.user_cache.get((c.get('user') or {}).get('id'), c.get('user')) or {}
+                 for c in comments]
+        df = pd.DataFrame(comments).reindex(columns=[
+            'comment_id', 'user_id', 'media_id', 'parent_comment_id', 'content',
+            'timestamp', 'deleted', 'tag', 'upvotes', 'downvotes',
+            'user_vote_type', 'reply_count', 'total_votes'])
+        user = pd.json_normalize(users).reindex(columns=list(self._IMPORTANT_USER_FIELDS))
+        # A single null in an int column makes pandas float64 the whole thing
+        # and serialize '1.0' where format_row writes '1' — round-trip the
+        # nullable id columns through Int64 to keep them bare digits
+        parent = df['parent_comment_id']
+        return pd.DataFrame({
+            'comment_id': df['comment_id'].astype('Int64'),
+            'user_id': df['user_id'].astype('Int64'),
+            'media_id': df['media_id'].astype('Int64'),
+            'parent_comment_id': parent.astype('Int64').astype(object)
+                .where(parent.notna(), 'NULL'),
+            'content': df['content'].fillna('').astype(str)
+                .str.replace('\t', ' ', regex=False).str.replace('\n', ' ', regex=False),
+            'timestamp': df['timestamp'],
+            'deleted': df['deleted'].eq(True).astype('int8'),
+            'tag': df['tag'].fillna('NULL'),
+            'upvotes': df['upvotes'].fillna(0).astype('int64'),
+            'downvotes': df['downvotes'].fillna(0).astype('int64'),
+            'user_vote_type': df['user_vote_type'].fillna(0).astype('int64'),
+            'username': user['username'].fillna('NULL'),
+            'profile_picture_url': user['profile_picture_url'].fillna('NULL'),
+            'is_mod': user['is_mod'].eq(True).astype('int8'),
+            'is_admin': user['is_admin'].eq(True).astype('int8'),
+            'reply_count': df['reply_count'].fillna(0).astype('int64'),
+            'total_votes': df['total_votes'].fillna(0).astype('int64'),
+        })
+
+    def _empty_marker_row(self, m_id):
+        row = [''] * len(self.field_names)
+        row[self.field_names.index('media_id')] = m_id
+        row[self.field_names.index('content')] = 'EMPTY_MARKER'
+        return tuple(row)
 
     def fetch_media_comments(self, m_id):
-        """Sequential Deep Scraper: Fetches every page for one media ID before moving on."""
+        """Deep Scraper: Fetches every page for one media ID before moving on.
+
+        Page p+1 downloads in a single-slot prefetch thread while page p is
+        being parsed, hiding one network RTT behind the JSON decode."""
         all_comments = []
         page = 1
-        headers = {"appauth": APP_AUTH_KEY, "Authorization": self.d_token}
-        
-        while True:
-            url = f"{API_ADDRESS}/comments/{m_id}/{page}?sort=newest"
-            try:
-                r = requests.get(url, headers=headers, timeout=15)
-                
-                if r.status_code == 429:
-                    print(f"\n⚠️ [Rate Limit] Waiting 30s for Media {m_id} (Page {page})...")
-                    time.sleep(30)
-                    continue # Retry the same page
-                
-                if r.status_code != 200:
-                    break # Break on 404 or other errors
-                    
-                data = r.json().get("comments", [])
-                if not data:
-                    break # End of comment thread
-                    
-                all_comments.extend(data)
-                page += 1
-                time.sleep(0.2) # Very slight delay to keep steady pace
-            except Exception as e:
-                print(f"\nError fetching media {m_id}: {e}")
-                break
+        session = self._thread_session()
+
+        def get_page(p):
+            # Hold here while another worker is riding out a 429 — hammering
+            # the API from 11 other threads just extends the penalty
+            while self._backoff.is_set():
+                time.sleep(1)
+            return session.get(f"{API_ADDRESS}/comments/{m_id}/{p}?sort=newest", timeout=15)
+
+        with ThreadPoolExecutor(max_workers=1) as prefetcher:
+            future = prefetcher.submit(get_page, page)
+            while True:
+                try:
+                    r = future.result()
+
+                    if r.status_code == 429:
+                        print(f"\n⚠️ [Rate Limit] Waiting 30s for Media {m_id} (Page {page})...")
+                        self._backoff.set()
+                        try:
+                            time.sleep(30)
+                        finally:
+                            self._backoff.clear()
+                        future = prefetcher.submit(get_page, page)
+                        continue # Retry the same page
+
+                    if r.status_code != 200:
+                        break # Break on 404 or other errors
+
+                    if r.content in _EMPTY_COMMENTS:
+                        break # End of comment thread, no parse needed
+
+                    # Speculatively start the next page before parsing this one
+                    future = prefetcher.submit(get_page, page + 1)
+                    payload = orjson.loads(r.content)
+                    data = payload.get("comments", [])
+                    if not data:
+                        break # End of comment thread
+
+                    all_comments.extend(data)
+                    # Honor an explicit end-of-thread hint when the API sends
+                    # one — skips the trailing empty-page probe entirely
+                    total = payload.get("totalPages") or payload.get("total_pages")
+                    if payload.get("has_more") is False or (total and page >= int(total)):
+                        future.cancel()
+                        break
+
+                    page += 1
+                    time.sleep(0.2) # Very slight delay to keep steady pace
+                except Exception as e:
+                    print(f"\nError fetching media {m_id}: {e}")
+                    break
         return all_comments
 
     def fetch_single_comment(self, cid):
-        headers = {"appauth": APP_AUTH_KEY, "Authorization": self.d_token}
-        try:
-            r = requests.get(f"{API_ADDRESS}/comments/{cid}", headers=headers, timeout=10)
-            if r.status_code == 429:
-                time.sleep(30)
-                return self.fetch_single_comment(cid)
-            return r.json() if r.status_code == 200 else None
-        except: return None
+        session = self._thread_session()
+        for attempt in range(8):
+            try:
+                r = session.get(f"{API_ADDRESS}/comments/{cid}", timeout=10)
+                if r.status_code != 429:
+                    return orjson.loads(r.content) if r.status_code == 200 else None
+                delay = _retry_after_seconds(r.headers, 2 ** attempt)
+            except:
+                return None
+            time.sleep(min(delay, 60))
+        return None
 
     def get_existing_data(self):
         captured_media, captured_comments = set(), set()
         if DB_PATH.exists():
             print(f"Scanning CSV at {DB_PATH}...")
+            # Stream with the stdlib csv reader: we only need two int sets,
+            # so a full typed DataFrame is pure overhead (and several times
+            # the file size in RAM)
             try:
-                df = pd.read_csv(DB_PATH, sep='\t', usecols=['media_id', 'comment_id', 'content'])
-                df = df[df['content'] != 'EMPTY_MARKER']
-                captured_media = set(df['media_id'].dropna().astype(int))
-                captured_comments = set(df['comment_id'].dropna().astype(int))
+                with open(DB_PATH, newline='', encoding='utf-8') as f:
+                    reader = csv.reader(f, delimiter='\t')
+                    header = next(reader, [])
+                    mi = header.index('media_id')
+                    ci = header.index('comment_id')
+                    co = header.index('content')
+                    for row in reader:
+                        try:
+                            if row[co] == 'EMPTY_MARKER':
+                                continue
+                            captured_media.add(int(float(row[mi])))
+                            captured_comments.add(int(float(row[ci])))
+                        except (IndexError, ValueError):
+                            continue  # dirty/short row — skip like dropna did
                 print(f"✓ Scanned {len(captured_comments)} existing comments.")
             except Exception as e:
                 print(f"Scan error: {e}")
@@ -192,97 +377,253 @@ class DantotsuManager:
             print("✓ Database is up to date.")
             return
             
-        print(f"Starting {label}: {len(target_ids)} media (Sequential processing).")
+        print(f"Starting {label}: {len(target_ids)} media (12 workers).")
         start_time = time.time()
         session_comments = 0
         mode = 'a' if DB_PATH.exists() else 'w'
-        
-        with open(DB_PATH, mode, newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=self.field_names, delimiter='\t', extrasaction='ignore')
-            if mode == 'w': writer.writeheader()
-            
-            for idx, m_id in enumerate(target_ids, 1):
-                # Fetch all pages for this specific media ID
-                comments = self.fetch_media_comments(m_id)
-                
-                elapsed = time.time() - start_time
-                mins, secs = divmod(int(elapsed), 60)
-                
-                if comments:
-                    writer.writerows([self.format_row(c) for c in comments])
-                    session_comments += len(comments)
-                    print(f"[{idx}/{len(target_ids)}] ✓ Media {m_id: <6} | +{len(comments): <4} | Total Session: {session_comments: <6} | {mins}m {secs}s")
-                else:
-                    writer.writerow({'media_id': m_id, 'content': 'EMPTY_MARKER'})
-                    print(f"[{idx}/{len(target_ids)}] ◌ Media {m_id: <6} empty | {mins}m {secs}s")
-                
-                f.flush() # Force save to disk after every media is finished
+
+        # 128KiB buffer: rows coalesce into one write() per buffer-full
+        # instead of one syscall per row
+        with open(DB_PATH, mode, newline='', encoding='utf-8', buffering=1 << 17) as f:
+            writer = csv.writer(f, delimiter='\t')
+            if mode == 'w': writer.writerow(self.field_names)
+
+            # Media are independent and the work is pure network wait, so fan
+            # out; rows are serialized behind the write lock as futures finish
+            with ThreadPoolExecutor(max_workers=12) as ex:
+                futures = {ex.submit(self.fetch_media_comments, m): m for m in target_ids}
+                try:
+                    for idx, future in enumerate(as_completed(futures), 1):
+                        m_id = futures[future]
+                        comments = future.result()
+                        self._enrich_users(comments)
+
+                        elapsed = time.time() - start_time
+                        mins, secs = divmod(int(elapsed), 60)
+
+                        with self._write_lock:
+                            if len(comments) >= self._VECTORIZE_MIN:
+                                # lineterminator matches csv.writer's CRLF so
+                                # rows look the same whichever path wrote them
+                                self._rows_dataframe(comments).to_csv(
+                                    f, sep='\t', header=False, index=False,
+                                    lineterminator='\r\n')
+                                session_comments += len(comments)
+                                print(f"[{idx}/{len(target_ids)}] ✓ Media {m_id: <6} | +{len(comments): <4} | Total Session: {session_comments: <6} | {mins}m {secs}s")
+                            elif comments:
+                                writer.writerows([self.format_row(c) for c in comments])
+                                session_comments += len(comments)
+                                print(f"[{idx}/{len(target_ids)}] ✓ Media {m_id: <6} | +{len(comments): <4} | Total Session: {session_comments: <6} | {mins}m {secs}s")
+                            else:
+                                writer.writerow(self._empty_marker_row(m_id))
+                                print(f"[{idx}/{len(target_ids)}] ◌ Media {m_id: <6} empty | {mins}m {secs}s")
+
+                            if idx % 50 == 0:
+                                f.flush() # Checkpoint to disk every 50 media
+                finally:
+                    f.flush() # Whatever finished is saved even on a crash
 
     def run_comment_id_gap_fill(self):
         _, existing = self.get_existing_data()
         auto_max = max(existing) if existing else 0
         target = input(f"Check up to ID (Default {auto_max}): ").strip()
         last_id = int(target) if target.isdigit() else auto_max
-        missing = sorted(list(set(range(1, last_id + 1)) - existing))
-        
+        # Boolean bitmap instead of set(range(...)) difference: ~1 byte per
+        # ID rather than a boxed int each, and the missing scan runs in C
+        present = np.zeros(last_id + 1, dtype=bool)
+        if existing:
+            idx = np.fromiter(existing, dtype=np.int64, count=len(existing))
+            present[idx[idx <= last_id]] = True
+        missing = (np.flatnonzero(~present[1:]) + 1).tolist()
+
         if not missing: return print("✓ No gaps found.")
-        print(f"Fetching {len(missing)} IDs sequentially...")
-        
-        with open(DB_PATH, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=self.field_names, delimiter='\t', extrasaction='ignore')
-            for idx, cid in enumerate(missing, 1):
-                res = self.fetch_single_comment(cid)
-                if res:
-                    writer.writerow(self.format_row(res))
-                    f.flush()
-                if idx % 10 == 0:
-                    print(f"Progress: {idx}/{len(missing)} IDs checked", end='\r')
+        print(f"Fetching {len(missing)} IDs (50 concurrent)...")
+        asyncio.run(self._gap_fill_async(missing))
         print("\n✓ Gap fill complete.")
 
+    async def _gap_fill_async(self, missing):
+        """Async gap fill: 50 in-flight single-comment GETs over HTTP/2.
+
+        Gap fill is pure network wait on tiny responses, so one multiplexed
+        httpx client with a semaphore replaces the sequential loop; a shared
+        gate pauses every task while any one of them is riding out a 429."""
+        sem = asyncio.Semaphore(50)
+        gate = asyncio.Event()
+        gate.set()  # set = clear to send
+
+        async def fetch(cid, client):
+            async with sem:
+                for attempt in range(8):
+                    await gate.wait()
+                    try:
+                        r = await client.get(f"{API_ADDRESS}/comments/{cid}", timeout=10)
+                    except Exception:
+                        return None
+                    if r.status_code != 429:
+                        return orjson.loads(r.content) if r.status_code == 200 else None
+                    if gate.is_set():
+                        gate.clear()
+                        try:
+                            delay = _retry_after_seconds(r.headers, 2 ** attempt)
+                            await asyncio.sleep(min(delay, 60))
+                        finally:
+                            gate.set()
+                return None
+
+        checked = 0
+        headers = {"appauth": APP_AUTH_KEY, "Authorization": self.d_token}
+        with open(DB_PATH, 'a', newline='', encoding='utf-8', buffering=1 << 17) as f:
+            writer = csv.writer(f, delimiter='\t')
+            batch = []
+            try:
+                async with httpx.AsyncClient(
+                        http2=True, headers=headers,
+                        limits=httpx.Limits(max_connections=50)) as client:
+                    # Chunked task creation keeps memory flat on huge gap lists
+                    for i in range(0, len(missing), 2000):
+                        tasks = [asyncio.ensure_future(fetch(cid, client))
+                                 for cid in missing[i:i + 2000]]
+                        for fut in asyncio.as_completed(tasks):
+                            res = await fut
+                            checked += 1
+                            if res:
+                                await asyncio.to_thread(self._enrich_users, [res])
+                                batch.append(self.format_row(res))
+                                if len(batch) >= 100:
+                                    writer.writerows(batch)
+                                    batch.clear()
+                            if checked % 100 == 0:
+                                print(f"Progress: {checked}/{len(missing)} IDs checked", end='\r')
+            finally:
+                if batch:
+                    writer.writerows(batch)
+
+    def _build_db_index(self):
+        """Map comment_id -> absolute byte offset of the row's deleted flag.
+
+        Content is tab-sanitized at write time, so splitting each raw line on
+        tabs locates the deleted field exactly. Legacy pandas rewrites
+        serialized the int columns as float64 ('12345.0', '0.0'); those rows
+        index too, because the flag's first byte is still the 0/1 digit and
+        flipping it turns '0.0' into '1.0', which downstream readers already
+        parse with int(float(...)). Anything else is left unindexed."""
+        offsets = {}
+        cid_field = self.field_names.index('comment_id')
+        del_field = self.field_names.index('deleted')
+        with open(DB_PATH, 'rb') as f:
+            pos = len(f.readline())  # skip header
+            for line in f:
+                parts = line.split(b'\t', del_field + 1)
+                if len(parts) > del_field:
+                    cid, flag = parts[cid_field], parts[del_field]
+                    if cid.endswith(b'.0'):
+                        cid = cid[:-2]
+                    if cid.isdigit() and flag in (b'0', b'1', b'0.0', b'1.0'):
+                        prefix = sum(len(p) for p in parts[:del_field]) + del_field
+                        offsets[int(cid)] = pos + prefix
+                pos += len(line)
+        return offsets
+
+    def _flip_deleted_inplace(self, deleted_ids):
+        """Flip deleted flags with seek+write — O(deletions), no rewrite.
+
+        Uses the sidecar index when its recorded mtime still matches the DB,
+        rebuilding it otherwise, and re-saves it against the new mtime."""
+        offsets = None
+        if IDX_PATH.exists():
+            try:
+                with open(IDX_PATH, 'rb') as f:
+                    idx = pickle.load(f)
+                if idx.get('mtime') == DB_PATH.stat().st_mtime_ns:
+                    offsets = idx['offsets']
+            except Exception:
+                offsets = None  # corrupt sidecar — rebuild from the file
+        if offsets is None:
+            offsets = self._build_db_index()
+        flipped = 0
+        with open(DB_PATH, 'r+b') as f:
+            for cid in deleted_ids:
+                off = offsets.get(cid)
+                if off is None:
+                    continue
+                f.seek(off)
+                if f.read(1) == b'0':
+                    f.seek(off)
+                    f.write(b'1')
+                    flipped += 1
+        try:
+            with open(IDX_PATH, 'wb') as f:
+                pickle.dump({'mtime': DB_PATH.stat().st_mtime_ns, 'offsets': offsets},
+                            f, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError:
+            pass  # index is a best-effort cache
+        return flipped
+
     def run_smart_sync(self):
         print("🚀 Starting Smart Sync...")
-        headers = {"Authorization": DISCORD_TOKEN}
-        r = requests.get(f"https://discord.com/api/v9/channels/{FEED_CHANNEL_ID}/messages?limit=100", headers=headers)
-        deleted_ids, active_media = [], set()
+        r = self.discord_session.get(
+            f"https://discord.com/api/v9/channels/{FEED_CHANNEL_ID}/messages?limit=100",
+            timeout=15)
+        deleted_ids, active_media = set(), set()
         
         if r.status_code == 200:
-            for m in r.json():
+            for m in orjson.loads(r.content):
                 content = m.get('content', '')
-                mid_match = re.search(r'\* Media: (\d+)', content)
+                mid_match = _MEDIA_RE.search(content)
                 if mid_match: active_media.add(int(mid_match.group(1)))
-                if MOD_BOT_ID in str(m.get('author', {}).get('id')) or DELETE_CMD_ID in content:
-                    cid_match = re.search(r'comment_id[:\s]+(\d+)', content)
-                    if cid_match: deleted_ids.append(int(cid_match.group(1)))
+                if str(m.get('author', {}).get('id')) == MOD_BOT_ID:
+                    cid_match = _DELCID_RE.search(content)
+                else:
+                    cid_match = _DELCMD_CID_RE.search(content)
+                if cid_match: deleted_ids.add(int(cid_match.group(1)))
 
         if DB_PATH.exists():
-            df = pd.read_csv(DB_PATH, sep='\t')
+            # Deletions flip flag bytes in place via the offset index —
+            # no full parse or rewrite to change a handful of rows
             if deleted_ids:
-                df.loc[df['comment_id'].isin(deleted_ids), 'deleted'] = 1
-                print(f"🔨 Flagged {len(deleted_ids)} Mod deletions.")
-            
-            # Use the sequential fetch for active media too
-            new_rows = []
-            for mid in active_media:
-                print(f"Refreshing Media {mid}...")
-                results = self.fetch_media_comments(mid)
-                new_rows.extend([self.format_row(c) for c in results])
-            
-            if new_rows:
-                df = pd.concat([df, pd.DataFrame(new_rows)]).drop_duplicates(subset=['comment_id'], keep='last')
-            
-            df.sort_values('comment_id').to_csv(DB_PATH, sep='\t', index=False)
-            print("✨ Smart Sync Complete.")
+                flipped = self._flip_deleted_inplace(deleted_ids)
+                print(f"🔨 Flagged {flipped} Mod deletions (in-place).")
+
+            # Append-only journal: refreshed rows go on the end and newer
+            # duplicates shadow older ones until cleanup_repair compacts.
+            # Daily cost is O(new rows), not a sorted rewrite of the file.
+            appended = 0
+            with open(DB_PATH, 'a', newline='', encoding='utf-8', buffering=1 << 17) as f:
+                writer = csv.writer(f, delimiter='\t')
+                for mid in active_media:
+                    print(f"Refreshing Media {mid}...")
+                    results = self.fetch_media_comments(mid)
+                    self._enrich_users(results)
+                    writer.writerows(map(self.format_row, results))
+                    appended += len(results)
+            print(f"✨ Smart Sync Complete. Appended {appended} rows.")
 
     def cleanup_repair(self):
         if not DB_PATH.exists(): return
         print("🧼 Cleaning and Repairing Database Headers...")
-        df = pd.read_csv(DB_PATH, sep='\t')
-        df = df[df['content'] != 'EMPTY_MARKER']
-        for col in self.field_names:
-            if col not in df.columns: df[col] = 'NULL'
-        df = df[self.field_names].drop_duplicates(subset=['comment_id']).sort_values('comment_id')
-        df.to_csv(DB_PATH, sep='\t', index=False)
-        print(f"✅ Cleanup Done. Total unique comments: {len(df)}")
+        # One streaming pass into a dict replaces the four pandas passes
+        # (read, filter, dedup, sort) that each held a full copy in RAM
+        rows = {}
+        with open(DB_PATH, newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f, delimiter='\t')
+            for row in reader:
+                if row.get('content') == 'EMPTY_MARKER':
+                    continue
+                try:
+                    cid = int(float(row['comment_id']))
+                except (TypeError, ValueError):
+                    continue
+                # Last occurrence wins: smart sync journals refreshed rows
+                # onto the end of the file, so later duplicates are newer
+                rows[cid] = ['NULL' if row.get(col) is None else row[col]
+                             for col in self.field_names]
+        tmp_path = DB_PATH.with_suffix('.tmp')
+        with open(tmp_path, 'w', newline='', encoding='utf-8', buffering=1 << 17) as f:
+            writer = csv.writer(f, delimiter='\t')
+            writer.writerow(self.field_names)
+            writer.writerows(rows[cid] for cid in sorted(rows))
+        os.replace(tmp_path, DB_PATH)
+        print(f"✅ Cleanup Done. Total unique comments: {len(rows)}")
 
 if __name__ == "__main__":
     al = AniListAuthenticator(ANILIST_CLIENT_ID, ANILIST_CLIENT_SECRET)
@@ -307,5 +648,8 @@ if __name__ == "__main__":
             elif mode == 'gaps':
                 print("4. Fill Sequence Gaps")
                 mgr.run_comment_id_gap_fill()
+            elif mode == 'cleanup':
+                print("5. Compact & Repair Database")
+                mgr.cleanup_repair()
             else:
                 print(f"Unknown mode: {mode}")